@@ -0,0 +1,33 @@
+" binding with job interface: this is necessary as there is no type for Job in python
+" (all the methods return None instead of Job), so the Job reference can not be hold
+" in python
+
+" session idx -> output received after the last complete line
+let s:partial_output = {}
+
+function! codex#start_job(idx) abort
+    let s:partial_output[a:idx] = ""
+    let options = {"out_mode": "raw", "out_cb": function("codex#handle_job_output", [a:idx])}
+    let g:codex_job{a:idx} = job_start(["codex", "proto"], options)
+endfunction
+
+function! codex#handle_job_output(idx, channel, msg) abort
+    " raw output comes in chunks: all the complete lines of a chunk are passed to
+    " python at once, while the rest waits for the next chunk (splitting at newline
+    " also keeps multibyte characters whole for json_encode)
+    let output = get(s:partial_output, a:idx, "") . a:msg
+    let end = strridx(output, "\n")
+    let s:partial_output[a:idx] = output[end + 1:]
+    if end < 0
+        return
+    endif
+    " the lines are passed to python as (JSON encoded) string literal, so there is
+    " no need to call back vim.eval("a:msg")
+    let session = 'codex.sessions[' . a:idx . ']'
+    execute 'py3 ' . session . '._handle_job_output(' . json_encode(output[:end]) . ')'
+endfunction
+
+function! codex#stop_job(idx) abort
+    call job_stop(g:codex_job{a:idx}, "kill")
+    unlet! s:partial_output[a:idx]
+endfunction
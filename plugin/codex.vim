@@ -1,2 +1,2 @@
-py3 import codex
-noremap <Leader>cs :py3 codex.start_codex_session()<CR>
+" python (and the codex module) is loaded on the first use, not on Vim startup
+noremap <Leader>cs :py3 import codex; codex.start_codex_session()<CR>
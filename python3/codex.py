@@ -1,7 +1,6 @@
-import re
-import subprocess
-from contextlib import contextmanager
-from typing import Callable, Literal
+import json
+from functools import lru_cache
+from typing import Any, Callable, Literal
 
 import vim
 from codex_protocol_event import (
@@ -12,10 +11,11 @@ from codex_protocol_event import (
     ApplyPatchApprovalRequestEvent,
     ErrorEvent,
     Event,
+    EventMessage,
     ExecApprovalRequestEvent,
     ExecCommandBeginEvent,
     ExecCommandEndEvent,
-    FileChange,
+    FileChanges,
     FileChangeType,
     PatchApplyBeginEvent,
     PatchApplyEndEvent,
@@ -36,27 +36,130 @@ from codex_protocol_submission import (
 # functions handlers
 bufadd = vim.Function("bufadd")
 bufload = vim.Function("bufload")
-timer_start = vim.Function("timer_start")
+win_execute = vim.Function("win_execute")
+
+
+def vim_literal(value: Any) -> str:
+    # JSON strings and lists are valid Vim expressions as well
+    return json.dumps(value, ensure_ascii=False)
+
+
+# buffer number -> window id (-1 if buffer is not displayed), invalidated by
+# CodexWindows autocommands on every change of windows layout
+_winids: dict[int, int] = {}
+
+
+def invalidate_winids() -> None:
+    _winids.clear()
+
+
+def watch_windows() -> None:
+    invalidate_winids()
+    vim.command(
+        "augroup CodexWindows\n"
+        "autocmd!\n"
+        "autocmd WinNew,WinClosed,BufWinEnter,TabEnter * py3 codex.invalidate_winids()\n"
+        "augroup END"
+    )
+
+
+def unwatch_windows() -> None:
+    vim.command("autocmd! CodexWindows")
+    invalidate_winids()
+
+
+@lru_cache(maxsize=None)
+def vim_substitute_literals(old: str, new: str) -> tuple[str, str]:
+    # (pattern, replacement) literals for vim substitute(), both matched literally and
+    # case-sensitively (regardless of 'ignorecase'); there are just a few distinct ones,
+    # so they are built only once
+    pattern = "\\V\\C" + old.replace("\\", "\\\\")
+    repl = new.replace("\\", "\\\\").replace("&", "\\&").replace("~", "\\~")
+    return vim_literal(pattern), vim_literal(repl)
+
+
+def find_winid(nr: int) -> int:
+    winid = _winids.get(nr)
+    if winid is None:
+        winid = _winids[nr] = int(vim.eval(f"bufwinid({nr})"))
+    return winid
+
+
+def split_lines(text: str) -> list[str]:
+    # lines split on "\n" only (like patch does), str.splitlines() would also split
+    # on form feeds, unicode line separators, etc.
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def apply_unified_diff(lines: list[str], unified_diff: str) -> list[str]:
+    # in-process replacement of `patch`: hunks (as generated by codex) are expected to
+    # match exactly, without any offset or fuzz
+    patched: list[str] = []
+    idx = 0  # index of first line not yet copied from the original lines
+    in_hunk = False  # everything before the first hunk is a header
+    for nr, line in enumerate(split_lines(unified_diff), start=1):
+        if line.startswith("@@"):
+            # @@ -start,count +start,count @@
+            old_range = line.split()[1][1:].split(",")
+            start = int(old_range[0])
+            count = int(old_range[1]) if len(old_range) > 1 else 1
+            # for empty old range, start is the line after which the hunk is inserted
+            end = start if count == 0 else start - 1
+            patched.extend(lines[idx:end])
+            idx = end
+            in_hunk = True
+        elif not in_hunk or line.startswith("\\"):  # "\ No newline at end of file"
+            continue
+        elif line.startswith("+"):
+            patched.append(line[1:])
+        else:
+            # removed or context line (leading space may be stripped for empty line),
+            # which has to match the original line
+            if idx >= len(lines) or lines[idx] != line[1:]:
+                raise ValueError(f"line {nr} of the diff does not match line {idx + 1}")
+            if not line.startswith("-"):
+                patched.append(lines[idx])
+            idx += 1
+    patched.extend(lines[idx:])
+    return patched
 
 
-@contextmanager
-def vim_window(window: vim.Window) -> None:
-    old_current_window = vim.current.window
-    vim.current.window = window
-    try:
-        yield None
-    finally:
-        vim.current.window = old_current_window
+# output is flushed to the buffer at most once per this interval (~60 FPS)
+FLUSH_INTERVAL_MS = 16
+# while the output window is hidden, output is kept pending (and flushed on show), but
+# only up to this number of the most recent lines
+MAX_PENDING_OUTPUT_LINES = 10000
 
+# status of executed command, shown in the output
+COMMAND_RUNNING = "command (running...)"
+COMMAND_OK = "command (OK)"
+COMMAND_ERROR = "command (ERROR)"
 
-def find_window(buffer: vim.Buffer) -> vim.Window | None:
-    # vim.windows is a sequence, which we have to search over
-    target_windows = [w for w in vim.windows if w.buffer == buffer]
-    return target_windows[0] if len(target_windows) > 0 else None
+# registries of live objects, referenced from vim (mappings, callbacks, timers)
+sessions: list["CodexSession"] = []
+codex_buffers_by_nr: dict[int, "CodexBuffers"] = {}  # by output buffer number
 
 
 class CodexBuffers:
+    __slots__ = (
+        "output_buffer",
+        "input_buffer",
+        "_output_nr",
+        "_input_nr",
+        "_input_modifiable",
+        "_pending_output",
+        "_dropped_output_lines",
+        "_flush_timer",
+    )
+
     def __init__(self) -> None:
+        # output highlighting (syntax/codexoutput.vim) is loaded with the filetype, as
+        # long as syntax is enabled; `syntax on` would reload all the syntax files
+        vim.command("if !exists('g:syntax_on') | syntax on | endif")
+
         # vim.buffers is a mapping nr->buffer
         self.output_buffer = vim.buffers[bufadd("")]
         bufload(self.output_buffer.number)
@@ -72,69 +175,164 @@ class CodexBuffers:
         self.input_buffer.options["buftype"] = "nofile"
         self.input_buffer.options["swapfile"] = False
 
+        # buffer numbers and input modifiable state are tracked on python side, so
+        # the hot paths do not have to ask vim for them
+        self._output_nr = self.output_buffer.number
+        self._input_nr = self.input_buffer.number
+        self._input_modifiable = True
+
+        codex_buffers_by_nr[self._output_nr] = self
+        self._pending_output: list[str] = []
+        self._dropped_output_lines = 0  # oldest pending lines dropped while hidden
+        self._flush_timer: int | None = None
+
+        watch_windows()
+
     @property
-    def output_window(self) -> vim.Window | None:
-        return find_window(self.output_buffer)
+    def output_winid(self) -> int:
+        return find_winid(self._output_nr)
 
     @property
-    def input_window(self) -> vim.Window | None:
-        return find_window(self.input_buffer)
+    def input_winid(self) -> int:
+        return find_winid(self._input_nr)
+
+    def _append_cmd(self, lines: list[str]) -> str:
+        return f"call appendbufline({self._output_nr}, '$', {vim_literal(lines)})"
 
     def append_output(self, text: str) -> None:
-        self.output_buffer.options["modifiable"] = True
-        self.output_buffer.append(text.splitlines() + [""])
-        self.output_buffer.options["modifiable"] = False
-        if self.output_window is not None and self.output_window.height > 0:
-            with vim_window(self.output_window):
-                vim.command("normal G")
-
-    def replace_last_output_line(self, pattern: str, repl: str) -> None:
-        self.output_buffer.options["modifiable"] = True
-        for idx in reversed(range(len(self.output_buffer))):
-            line = self.output_buffer[idx]
-            if re.search(pattern, line) is not None:
-                self.output_buffer[idx] = re.sub(pattern, repl, line)
-        self.output_buffer.options["modifiable"] = False
+        # streamed output is collected and appended in batches by the timer, or by
+        # show() if the output window is hidden
+        self._pending_output.extend(text.splitlines())
+        self._pending_output.append("")
+        if self._flush_timer is not None:
+            return
+        if self.output_winid >= 0:
+            self._flush_timer = int(
+                vim.eval(
+                    f"timer_start({FLUSH_INTERVAL_MS}, {{-> execute('py3 codex."
+                    f"codex_buffers_by_nr[{self._output_nr}]._flush_output()')}})"
+                )
+            )
+        elif len(self._pending_output) > MAX_PENDING_OUTPUT_LINES:
+            dropped = len(self._pending_output) - MAX_PENDING_OUTPUT_LINES
+            del self._pending_output[:dropped]
+            self._dropped_output_lines += dropped
+
+    def _flush_output(self, *cmds: str) -> None:
+        # pending output is appended before given commands, all of them within single
+        # Ex command, which switches (non-modifiable) output buffer to modifiable only
+        # once and then scrolls its window (if any) to the bottom
+        nr = self._output_nr
+        batch = [f"call setbufvar({nr}, '&modifiable', 1)"]
+        if self._flush_timer is not None:
+            # no-op when called by the timer itself
+            batch.insert(0, f"call timer_stop({self._flush_timer})")
+            self._flush_timer = None
+        if self._dropped_output_lines > 0:
+            self._pending_output.insert(
+                0, f"... {self._dropped_output_lines} lines dropped while hidden"
+            )
+            self._dropped_output_lines = 0
+        if len(self._pending_output) > 0:
+            batch.append(self._append_cmd(self._pending_output))
+            self._pending_output.clear()
+        elif len(cmds) == 0:
+            return
+        batch.extend(cmds)
+        batch.append(f"call setbufvar({nr}, '&modifiable', 0)")
+        if self.output_winid >= 0:
+            batch.append(f"call win_execute({self.output_winid}, 'normal! G')")
+        vim.command(" | ".join(batch))
+
+    def replace_last_output_line(self, old: str, new: str) -> None:
+        # replaces (first) occurrence of old text in the last line containing it
+        for idx in reversed(range(len(self._pending_output))):
+            if old in self._pending_output[idx]:
+                self._pending_output[idx] = self._pending_output[idx].replace(old, new, 1)
+                return
+
+        # otherwise, the last matching line is searched (in reversed list of lines) and
+        # substituted by Vim itself, along with pending output
+        nr = self._output_nr
+        pattern, repl = vim_substitute_literals(old, new)
+        substitute_last = (
+            f"{{lines -> {{idx -> idx < 0 ? 0 : setbufline({nr}, len(lines) - idx,"
+            f" substitute(lines[idx], {pattern}, {repl}, ''))}}"
+            f"(match(lines, {pattern}))}}"
+        )
+        self._flush_output(
+            f"call call({substitute_last}, [reverse(getbufline({nr}, 1, '$'))])"
+        )
+
+    def _set_input_modifiable_cmd(self, modifiable: bool) -> list[str]:
+        if self._input_modifiable == modifiable:
+            return []
+        self._input_modifiable = modifiable
+        return [f"call setbufvar({self._input_nr}, '&modifiable', {int(modifiable)})"]
 
     def show_status_in_input(self, message: str) -> None:
-        self.input_buffer.options["modifiable"] = True
-        self.input_buffer[:] = message.splitlines()
-        self.input_buffer.options["modifiable"] = False
+        nr = self._input_nr
+        vim.command(
+            " | ".join(
+                self._set_input_modifiable_cmd(True)
+                + [
+                    f"call deletebufline({nr}, 1, '$')",
+                    f"call setbufline({nr}, 1, {vim_literal(message.splitlines())})",
+                ]
+                + self._set_input_modifiable_cmd(False)
+            )
+        )
 
     def hide_status_in_input(self) -> None:
-        self.input_buffer.options["modifiable"] = True
-        self.input_buffer[:] = []
+        vim.command(
+            " | ".join(
+                self._set_input_modifiable_cmd(True)
+                + [f"call deletebufline({self._input_nr}, 1, '$')"]
+            )
+        )
+
+    def take_input(self) -> str:
+        # text of the input buffer, which is cleared at once (within single vim.eval)
+        nr = self._input_nr
+        return vim.eval(
+            f"[join(getbufline({nr}, 1, '$'), \"\\n\"), deletebufline({nr}, 1, '$')][0]"
+        )
 
     def hide(self) -> None:
-        if self.output_window is not None:
-            vim.command(f"{self.output_window.number}hide")
-        if self.input_window is not None:
-            vim.command(f"{self.input_window.number}hide")
+        if self.output_winid >= 0:
+            win_execute(self.output_winid, "hide")
+        if self.input_winid >= 0:
+            win_execute(self.input_winid, "hide")
 
     def show(self) -> None:
-        vim.command(f"botright vertical sbuffer {self.output_buffer.number}")
-
-        self.output_window.width = 70
-        with vim_window(self.output_window):
-            vim.command("syntax on")
-            vim.command(f"below horizontal sbuffer {self.input_buffer.number}")
-
-        self.input_window.height = 5
-        vim.current.window = self.input_window
+        # each sbuffer makes the new window current, so no window switching needed
+        vim.command(
+            f"botright vertical sbuffer {self._output_nr}\n"
+            "vertical resize 70\n"
+            f"below horizontal sbuffer {self._input_nr}\n"
+            "resize 5"
+        )
+        self._flush_output()  # output collected while the window was hidden
 
     def switch(self) -> None:
-        if self.input_window is None or self.output_window is None:
+        if self.input_winid < 0 or self.output_winid < 0:
             self.hide()  # make sure there is only one instance of windows
             self.show()
         else:
             self.hide()
 
     def delete(self) -> None:
-        vim.command(f"bdelete {self.output_buffer.number}")
-        vim.command(f"bdelete {self.input_buffer.number}")
+        if self._flush_timer is not None:
+            vim.command(f"call timer_stop({self._flush_timer})")
+        del codex_buffers_by_nr[self._output_nr]
+        vim.command(f"bdelete {self._output_nr}")
+        vim.command(f"bdelete {self._input_nr}")
+        unwatch_windows()
 
 
 class ApplyPatchBuffer:
+    __slots__ = ("patch_buffer", "largest_winid")
+
     def __init__(self) -> None:
         self.patch_buffer = vim.buffers[bufadd("")]
         bufload(self.patch_buffer.number)
@@ -142,91 +340,112 @@ class ApplyPatchBuffer:
         self.patch_buffer.options["buftype"] = "nofile"
         self.patch_buffer.options["swapfile"] = False
 
-        self.largest_window: vim.Window | None = None
+        self.largest_winid: int | None = None
 
     @property
-    def patch_window(self) -> vim.Window | None:
-        return find_window(self.patch_buffer)
-
-    def _apply_patch_in_memory(self, path: str, unified_diff: str) -> str:
-        p = subprocess.Popen(
-            ["patch", "-i", "-", "-o", "-", path],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-        stdout, stderr = p.communicate(unified_diff)
-        return stdout
+    def patch_winid(self) -> int:
+        return find_winid(self.patch_buffer.number)
+
+    def _apply_patch_in_memory(self, path: str, unified_diff: str) -> list[str]:
+        with open(path, encoding="utf-8") as f:
+            return apply_unified_diff(split_lines(f.read()), unified_diff)
 
     def show(self, path: str, unified_diff: str) -> None:
-        patched_content = self._apply_patch_in_memory(path, unified_diff)
-        self.patch_buffer[:] = patched_content.splitlines()
-        self.largest_window = max(vim.windows, key=lambda w: w.width)
-        with vim_window(self.largest_window):
-            vim.command(f"edit {path}")
-            vim.command("diffthis")
-            vim.command(f"vertical sbuffer {self.patch_buffer.number}")
-        with vim_window(self.patch_window):
-            vim.command("diffthis")
+        try:
+            self.patch_buffer[:] = self._apply_patch_in_memory(path, unified_diff)
+        except (OSError, ValueError) as e:
+            # missing/undecodable file or a hunk not matching it, the error is shown
+            # instead of the preview (UnicodeDecodeError is a ValueError)
+            self.patch_buffer[:] = [f"patch could not be applied to {path}: {e}"]
+        # the widest window in the current tab page (the first one for a tie)
+        self.largest_winid = int(
+            vim.eval(
+                "sort(filter(getwininfo(), {_, w -> w.tabnr == tabpagenr()}),"
+                " {a, b -> b.width - a.width})[0].winid"
+            )
+        )
+        # the second diffthis runs in the new patch window (current within win_execute)
+        win_execute(
+            self.largest_winid,
+            [
+                f"edit {path}",
+                "diffthis",
+                f"vertical sbuffer {self.patch_buffer.number}",
+                "diffthis",
+            ],
+        )
 
     def hide(self) -> None:
-        if self.patch_window is not None:
-            with vim_window(self.largest_window):
-                vim.command("diffoff")
-            vim.command(f"{self.patch_window.number}hide")
+        if self.patch_winid >= 0:
+            win_execute(self.largest_winid, "diffoff")
+            win_execute(self.patch_winid, "hide")
 
     def delete(self) -> None:
         vim.command(f"bdelete {self.patch_buffer.number}")
 
 
 class CodexSession:
-    sessions: list["CodexSession"] = []
+    __slots__ = (
+        "session_idx",
+        "_stop_job",
+        "codex_buffers",
+        "apply_patch_buffer",
+        "last_approval_request_type",
+        "last_approval_request_submission_id",
+        "last_approval_request_summary",
+        "_dispatch",
+    )
 
     def __init__(self) -> None:
-        self.session_idx = len(self.sessions)
-        self.sessions.append(self)
+        self.session_idx = len(sessions)
+        sessions.append(self)
 
-        # binding with job interface: this is necessary as there is no type for Job in
-        # python (all the methods return None instead of Job), so the Job reference can
-        # not be hold in python
-        vim.command(
-            f"""\
-            function! HandleCodexJobOutput{self.session_idx}(channel, msg)
-                py3 codex.CodexSession.sessions[{self.session_idx}]._handle_job_output(vim.eval("a:msg"))
-            endfunction
-            let g:codex_job{self.session_idx} = job_start(["codex", "proto"], \
-                    {{"out_mode": "nl", "out_cb": "HandleCodexJobOutput{self.session_idx}"}})
-            function! SendToCodexJob{self.session_idx}(msg)
-                call ch_sendraw(g:codex_job{self.session_idx}, a:msg)
-            endfunction
-            function! StopCodexJob{self.session_idx}()
-                call job_stop(g:codex_job{self.session_idx}, "kill")
-            endfunction
-        """
-        )
-        self._send_to_job = vim.Function(f"SendToCodexJob{self.session_idx}")
-        self._stop_job = vim.Function(f"StopCodexJob{self.session_idx}")
+        # job is managed by autoload/codex.vim (:call sources it on the first use)
+        vim.command(f"call codex#start_job({self.session_idx})")
+        self._stop_job = vim.Function("codex#stop_job", args=[self.session_idx])
 
         # create codex buffers
         self.codex_buffers = CodexBuffers()
         self.codex_buffers.show()
 
         # setup mappings
-        session = f"codex.CodexSession.sessions[{self.session_idx}]"
+        session = f"codex.sessions[{self.session_idx}]"
         vim.command(f"noremap <Leader>cS :py3 {session}.stop()<CR>")
         vim.command(f"noremap <Leader>cc :py3 {session}.codex_buffers.switch()<CR>")
         vim.command(f"noremap <Leader>cf :py3 {session}.include_context()<CR>")
-        with vim_window(self.codex_buffers.input_window):
-            vim.command(f"nmap <buffer> <Enter> :py3 {session}.send_user_message()<CR>")
-            vim.command(f"nmap <buffer> <C-C> :py3 {session}.interrupt()<CR>")
-            vim.command(f"nmap <buffer> <C-A> :py3 {session}.approval(codex.ReviewDecision.APPROVED)<CR>")
-            vim.command(f"nmap <buffer> <C-D> :py3 {session}.approval(codex.ReviewDecision.DENIED)<CR>")
+        win_execute(
+            self.codex_buffers.input_winid,
+            [
+                f"nmap <buffer> <Enter> :py3 {session}.send_user_message()<CR>",
+                f"nmap <buffer> <C-C> :py3 {session}.interrupt()<CR>",
+                f"nmap <buffer> <C-A> :py3 {session}.approval(codex.ReviewDecision.APPROVED)<CR>",
+                f"nmap <buffer> <C-D> :py3 {session}.approval(codex.ReviewDecision.DENIED)<CR>",
+            ],
+        )
 
         self.apply_patch_buffer = ApplyPatchBuffer()
 
         self.last_approval_request_type: Literal["exec", "patch"] | None = None
         self.last_approval_request_submission_id: str | None = None
+        # summary of changes of the pending patch approval request, computed once
+        self.last_approval_request_summary: str | None = None
+
+        # event message type -> handler
+        self._dispatch: dict[type[EventMessage], Callable[[str, Any], None]] = {
+            AgentMessageEvent: self._handle_agent_message,
+            AgentMessageDeltaEvent: self._handle_agent_message_delta,
+            AgentReasoningEvent: self._handle_agent_reasoning,
+            AgentReasoningDeltaEvent: self._handle_agent_reasoning_delta,
+            ErrorEvent: self._handle_error,
+            TaskStarted: self._handle_task_started,
+            TaskCompleteEvent: self._handle_task_completed,
+            ExecApprovalRequestEvent: self._handle_exec_approval_request,
+            ExecCommandBeginEvent: self._handle_exec_command_begin,
+            ExecCommandEndEvent: self._handle_exec_command_end,
+            ApplyPatchApprovalRequestEvent: self._handle_apply_patch_approval_request,
+            PatchApplyBeginEvent: self._handle_patch_apply_begin,
+            PatchApplyEndEvent: self._handle_patch_apply_end,
+        }
 
     def _handle_agent_message(self, id: str, message: AgentMessageEvent) -> None:
         self.codex_buffers.append_output(f"codex\n{message.message}")
@@ -263,18 +482,18 @@ class CodexSession:
         self, id: str, message: ExecCommandBeginEvent
     ) -> None:
         self.codex_buffers.append_output(
-            f"command (running...)\n$ {' '.join(message.command)}"
+            f"{COMMAND_RUNNING}\n$ {' '.join(message.command)}"
         )
 
     def _handle_exec_command_end(self, id: str, message: ExecCommandEndEvent) -> None:
         self.codex_buffers.replace_last_output_line(
-            r"command \(running\.\.\.\)",
-            f"command ({'OK' if message.exit_code == 0 else 'ERROR'})",
+            COMMAND_RUNNING,
+            COMMAND_OK if message.exit_code == 0 else COMMAND_ERROR,
         )
 
-    def _file_changes_summary(self, changes: dict[str, FileChange]) -> str:
+    def _file_changes_summary(self, changes: FileChanges) -> str:
         return "\n".join(
-            f"{change.type.value} {path}" for path, change in changes.items()
+            [f"{change.type} {path}" for path, change in changes.items()]
         )
 
     def _handle_apply_patch_approval_request(
@@ -282,9 +501,10 @@ class CodexSession:
     ) -> None:
         self.last_approval_request_type = "patch"
         self.last_approval_request_submission_id = id
+        self.last_approval_request_summary = self._file_changes_summary(message.changes)
         self.codex_buffers.show_status_in_input(
             f"PATCH APPROVAL REQUEST: {message.reason or ''}\n"
-            + self._file_changes_summary(message.changes)
+            + self.last_approval_request_summary
         )
         update_changes = [
             (p, ch)
@@ -301,40 +521,23 @@ class CodexSession:
     def _handle_patch_apply_end(self, id: str, message: PatchApplyEndEvent) -> None:
         self.codex_buffers.append_output(str(message))  # TODO
 
-    def _handle_job_output(self, message_str: str) -> None:
-        event = Event.from_json(message_str)
-        if isinstance(event.message, AgentMessageEvent):
-            self._handle_agent_message(event.id, event.message)
-        elif isinstance(event.message, AgentMessageDeltaEvent):
-            self._handle_agent_message_delta(event.id, event.message)
-        elif isinstance(event.message, AgentReasoningEvent):
-            self._handle_agent_reasoning(event.id, event.message)
-        elif isinstance(event.message, AgentReasoningDeltaEvent):
-            self._handle_agent_reasoning_delta(event.id, event.message)
-        elif isinstance(event.message, ErrorEvent):
-            self._handle_error(event.id, event.message)
-        elif isinstance(event.message, TaskStarted):
-            self._handle_task_started(event.id, event.message)
-        elif isinstance(event.message, TaskCompleteEvent):
-            self._handle_task_completed(event.id, event.message)
-        elif isinstance(event.message, ExecApprovalRequestEvent):
-            self._handle_exec_approval_request(event.id, event.message)
-        elif isinstance(event.message, ExecCommandBeginEvent):
-            self._handle_exec_command_begin(event.id, event.message)
-        elif isinstance(event.message, ExecCommandEndEvent):
-            self._handle_exec_command_end(event.id, event.message)
-        elif isinstance(event.message, ApplyPatchApprovalRequestEvent):
-            self._handle_apply_patch_approval_request(event.id, event.message)
-        elif isinstance(event.message, PatchApplyBeginEvent):
-            self._handle_patch_apply_begin(event.id, event.message)
-        elif isinstance(event.message, PatchApplyEndEvent):
-            self._handle_patch_apply_end(event.id, event.message)
-        else:
-            self.codex_buffers.append_output(str(event.message))
+    def _handle_unknown(self, id: str, message: EventMessage) -> None:
+        self.codex_buffers.append_output(str(message))
+
+    def _handle_job_output(self, output: str) -> None:
+        # complete lines of output, each of them being a single JSON encoded event
+        # (an invalid one is reported, without dropping the other events of the chunk)
+        for event in Event.from_jsonlines(output):
+            if isinstance(event, Exception):
+                self.codex_buffers.append_output(f"invalid event: {event!r}")
+                continue
+            handler = self._dispatch.get(type(event.message), self._handle_unknown)
+            handler(event.id, event.message)
 
     def _send(self, op: SubmissionOperation) -> None:
-        submission = Submission(operation=op)
-        self._send_to_job(submission.to_json() + "\n")
+        # one Ex command, without going through a vim function wrapper
+        payload = vim_literal(f"{Submission(operation=op).to_json()}\n")
+        vim.command(f"call ch_sendraw(g:codex_job{self.session_idx}, {payload})")
 
     def interrupt(self) -> None:
         self._send(Interrupt())
@@ -347,8 +550,7 @@ class CodexSession:
             self.codex_buffers.input_buffer[-1] += f" file:{filename} "
 
     def send_user_message(self) -> None:
-        text = "\n".join(self.codex_buffers.input_buffer[:])
-        del self.codex_buffers.input_buffer[:]
+        text = self.codex_buffers.take_input()
         self.codex_buffers.append_output(f"\nuser\n{text}\n")
         self._send(UserInput([TextInput(text)]))
 
@@ -365,17 +567,18 @@ class CodexSession:
                 self.apply_patch_buffer.hide()
             self.codex_buffers.hide_status_in_input()
             self.last_approval_request_type = None
+            self.last_approval_request_summary = None
 
     def stop(self) -> None:
         self._stop_job()
         self.codex_buffers.delete()
         self.apply_patch_buffer.delete()
-        CodexSession.sessions.remove(self)
+        sessions.remove(self)
 
 
 def start_codex_session() -> None:
     # TODO implement multiple sessions
-    if len(CodexSession.sessions) == 0:
+    if len(sessions) == 0:
         CodexSession()
     else:
         print("Codex session already exists.")
@@ -1,139 +1,74 @@
-import json
+from collections.abc import Iterator, Mapping
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any
+from operator import itemgetter
+from typing import Any, Callable
 
+try:
+    from enum import StrEnum
+except ImportError:  # python < 3.11
 
-@dataclass
+    class StrEnum(str, Enum):
+        def __str__(self) -> str:
+            return str.__str__(self)
+
+
+try:
+    from orjson import loads
+except ImportError:  # orjson is optional (it may be unavailable for Vim's python)
+    from json import loads
+
+
+@dataclass(slots=True)
 class EventMessage:
     @staticmethod
     def from_dict(d: dict[str, Any]) -> "EventMessage":
-        t = d.get("type")
         # dispatch based on event type
-        if t == "error":
-            return ErrorEvent(message=d.get("message"))
-        if t == "task_started":
-            return TaskStarted()
-        if t == "task_complete":
-            return TaskCompleteEvent(last_agent_message=d.get("last_agent_message"))
-        if t == "token_count":
-            return TokenCount(
-                input_tokens=d.get("input_tokens", 0),
-                cached_input_tokens=d.get("cached_input_tokens"),
-                output_tokens=d.get("output_tokens", 0),
-                reasoning_output_tokens=d.get("reasoning_output_tokens"),
-                total_tokens=d.get("total_tokens", 0),
-            )
-        if t == "agent_message":
-            return AgentMessageEvent(message=d.get("message"))
-        if t == "agent_message_delta":
-            return AgentMessageDeltaEvent(delta=d.get("delta"))
-        if t == "agent_reasoning":
-            return AgentReasoningEvent(text=d.get("text"))
-        if t == "agent_reasoning_delta":
-            return AgentReasoningDeltaEvent(delta=d.get("delta"))
-        if t == "session_configured":
-            return SessionConfiguredEvent(
-                session_id=d.get("session_id"),
-                model=d.get("model"),
-                history_log_id=d.get("history_log_id", 0),
-                history_entry_count=d.get("history_entry_count", 0),
-            )
-        if t == "mcp_tool_call_begin":
-            return McpToolCallBeginEvent(
-                call_id=d.get("call_id"),
-                server=d.get("server"),
-                tool=d.get("tool"),
-                arguments=d.get("arguments"),
-            )
-        if t == "mcp_tool_call_end":
-            return McpToolCallEndEvent(
-                call_id=d.get("call_id"),
-                result=d.get("result"),
-            )
-        if t == "exec_command_begin":
-            return ExecCommandBeginEvent(
-                call_id=d.get("call_id"),
-                command=d.get("command", []),
-                cwd=d.get("cwd"),
-            )
-        if t == "exec_command_end":
-            return ExecCommandEndEvent(
-                call_id=d.get("call_id"),
-                stdout=d.get("stdout"),
-                stderr=d.get("stderr"),
-                exit_code=d.get("exit_code", 0),
-            )
-        if t == "exec_approval_request":
-            return ExecApprovalRequestEvent(
-                command=d.get("command", []),
-                cwd=d.get("cwd"),
-                reason=d.get("reason"),
-            )
-        if t == "apply_patch_approval_request":
-            # parse file changes
-            changes = {
-                p: FileChange.from_dict(ch) for p, ch in d.get("changes", {}).items()
-            }
-            return ApplyPatchApprovalRequestEvent(
-                changes=changes,
-                reason=d.get("reason"),
-                grant_root=d.get("grant_root"),
-            )
-        if t == "background_event":
-            return BackgroundEvent(message=d.get("message"))
-        if t == "patch_apply_begin":
-            changes = {
-                p: FileChange.from_dict(ch) for p, ch in d.get("changes", {}).items()
-            }
-            return PatchApplyBeginEvent(
-                call_id=d.get("call_id"),
-                auto_approved=d.get("auto_approved", False),
-                changes=changes,
-            )
-        if t == "patch_apply_end":
-            return PatchApplyEndEvent(
-                call_id=d.get("call_id"),
-                stdout=d.get("stdout"),
-                stderr=d.get("stderr"),
-                success=d.get("success", False),
-            )
-        if t == "get_history_entry_response":
-            entry = d.get("entry")
-            hist = HistoryEntry(**entry) if entry is not None else None
-            return GetHistoryEntryResponseEvent(
-                offset=d.get("offset", 0),
-                log_id=d.get("log_id", 0),
-                entry=hist,
-            )
-        # unknown type
-        return UnknownEvent(d)
+        from_dict = _EVENT_DISPATCH.get(d.get("type"))
+        return from_dict(d) if from_dict is not None else UnknownEvent(d)
 
 
-@dataclass
+@dataclass(slots=True)
 class Event:
     id: str
     message: EventMessage
 
     @staticmethod
-    def from_json(json_text: str) -> "Event":
-        d = json.loads(json_text)
+    def from_json(json_text: str | bytes) -> "Event":
+        d = loads(json_text)
         return Event(id=d["id"], message=EventMessage.from_dict(d["msg"]))
 
+    @staticmethod
+    def from_jsonlines(json_lines: str | bytes) -> Iterator["Event | Exception"]:
+        # newline delimited events (empty lines are skipped); for a line which is not
+        # a valid event, its error is given instead, so the other lines are not lost
+        separator = b"\n" if isinstance(json_lines, bytes) else "\n"
+        from_json = Event.from_json
+        for line in json_lines.split(separator):
+            if line:
+                try:
+                    event = from_json(line)
+                except (ValueError, KeyError, TypeError) as e:
+                    yield e
+                else:
+                    yield event
+
 
 @dataclass
 class UnknownEvent(EventMessage):
+    __slots__ = ("data",)
+
     def __init__(self, data: dict[str, Any]):
         self.data = data
 
 
-class FileChangeType(Enum):
+class FileChangeType(StrEnum):
     ADD = "add"
     DELETE = "delete"
     UPDATE = "update"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class FileChange:
     type: FileChangeType
     content: str | None = None
@@ -142,44 +77,71 @@ class FileChange:
 
     @staticmethod
     def from_dict(d: dict[str, Any]) -> "FileChange":
-        t = next(iter(d.keys()))
-        if t == "add":
-            return FileChange(type=FileChangeType.ADD, content=d[t]["content"])
-        elif t == "delete":
-            return FileChange(type=FileChangeType.DELETE)
-        elif t == "update":
-            return FileChange(
-                type=FileChangeType.UPDATE,
-                unified_diff=d[t]["unified_diff"],
-                move_path=d[t]["move_path"],
-            )
-        else:
+        t, change = next(iter(d.items()))
+        from_dict = _FILE_CHANGE_DISPATCH.get(t)
+        if from_dict is None:
             raise NotImplementedError(f"Change type '{t}' unknown.")
+        return from_dict(change)
 
 
-@dataclass
+_FILE_CHANGE_DISPATCH: dict[str, Callable[[dict[str, Any]], FileChange]] = {
+    "add": lambda d: FileChange(FileChangeType.ADD, content=d["content"]),
+    "delete": lambda d: FileChange(FileChangeType.DELETE),
+    "update": lambda d: FileChange(
+        FileChangeType.UPDATE,
+        unified_diff=d["unified_diff"],
+        move_path=d["move_path"],
+    ),
+}
+
+
+class FileChanges(Mapping[str, FileChange]):
+    # path -> FileChange mapping, which parses each change on its first access
+    __slots__ = ("_changes", "_parsed")
+
+    def __init__(self, changes: dict[str, Any]):
+        self._changes = changes
+        self._parsed: dict[str, FileChange] = {}
+
+    def __getitem__(self, path: str) -> FileChange:
+        change = self._parsed.get(path)
+        if change is None:
+            change = self._parsed[path] = FileChange.from_dict(self._changes[path])
+        return change
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._changes)
+
+    def __len__(self) -> int:
+        return len(self._changes)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+@dataclass(frozen=True, slots=True)
 class HistoryEntry:
     session_id: str
     ts: int
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ErrorEvent(EventMessage):
     message: str
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskStarted(EventMessage):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskCompleteEvent(EventMessage):
     last_agent_message: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class TokenCount(EventMessage):
     input_tokens: int
     cached_input_tokens: int | None
@@ -188,27 +150,27 @@ class TokenCount(EventMessage):
     total_tokens: int
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentMessageEvent(EventMessage):
     message: str
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentMessageDeltaEvent(EventMessage):
     delta: str
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentReasoningEvent(EventMessage):
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentReasoningDeltaEvent(EventMessage):
     delta: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionConfiguredEvent(EventMessage):
     session_id: str
     model: str
@@ -216,7 +178,7 @@ class SessionConfiguredEvent(EventMessage):
     history_entry_count: int
 
 
-@dataclass
+@dataclass(slots=True)
 class McpToolCallBeginEvent(EventMessage):
     call_id: str
     server: str
@@ -224,20 +186,20 @@ class McpToolCallBeginEvent(EventMessage):
     arguments: Any
 
 
-@dataclass
+@dataclass(slots=True)
 class McpToolCallEndEvent(EventMessage):
     call_id: str
     result: Any
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecCommandBeginEvent(EventMessage):
     call_id: str
     command: list[str]
     cwd: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecCommandEndEvent(EventMessage):
     call_id: str
     stdout: str
@@ -245,33 +207,33 @@ class ExecCommandEndEvent(EventMessage):
     exit_code: int
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecApprovalRequestEvent(EventMessage):
     command: list[str]
     cwd: str
     reason: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class ApplyPatchApprovalRequestEvent(EventMessage):
-    changes: dict[str, FileChange]
+    changes: FileChanges
     reason: str | None
     grant_root: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class BackgroundEvent(EventMessage):
     message: str
 
 
-@dataclass
+@dataclass(slots=True)
 class PatchApplyBeginEvent(EventMessage):
     call_id: str
     auto_approved: bool
-    changes: dict[str, FileChange]
+    changes: FileChanges
 
 
-@dataclass
+@dataclass(slots=True)
 class PatchApplyEndEvent(EventMessage):
     call_id: str
     stdout: str
@@ -279,8 +241,92 @@ class PatchApplyEndEvent(EventMessage):
     success: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class GetHistoryEntryResponseEvent(EventMessage):
     offset: int
     log_id: int
     entry: HistoryEntry | None
+
+
+# fields which are always sent (in the order of event message fields), fetched at once
+_TOKEN_COUNT_ITEMS = itemgetter("input_tokens", "output_tokens", "total_tokens")
+_SESSION_CONFIGURED_ITEMS = itemgetter(
+    "session_id", "model", "history_log_id", "history_entry_count"
+)
+_EXEC_COMMAND_END_ITEMS = itemgetter("call_id", "stdout", "stderr", "exit_code")
+
+
+def _token_count_from_dict(d: dict[str, Any]) -> TokenCount:
+    input_tokens, output_tokens, total_tokens = _TOKEN_COUNT_ITEMS(d)
+    return TokenCount(
+        input_tokens,
+        d.get("cached_input_tokens"),
+        output_tokens,
+        d.get("reasoning_output_tokens"),
+        total_tokens,
+    )
+
+
+# event type -> constructor of event message from its dict
+_EVENT_DISPATCH: dict[str, Callable[[dict[str, Any]], EventMessage]] = {
+    "error": lambda d: ErrorEvent(message=d.get("message")),
+    "task_started": lambda d: TaskStarted(),
+    "task_complete": lambda d: TaskCompleteEvent(
+        last_agent_message=d.get("last_agent_message")
+    ),
+    "token_count": _token_count_from_dict,
+    "agent_message": lambda d: AgentMessageEvent(message=d.get("message")),
+    "agent_message_delta": lambda d: AgentMessageDeltaEvent(delta=d.get("delta")),
+    "agent_reasoning": lambda d: AgentReasoningEvent(text=d.get("text")),
+    "agent_reasoning_delta": lambda d: AgentReasoningDeltaEvent(delta=d.get("delta")),
+    "session_configured": lambda d: SessionConfiguredEvent(
+        *_SESSION_CONFIGURED_ITEMS(d)
+    ),
+    "mcp_tool_call_begin": lambda d: McpToolCallBeginEvent(
+        call_id=d.get("call_id"),
+        server=d.get("server"),
+        tool=d.get("tool"),
+        arguments=d.get("arguments"),
+    ),
+    "mcp_tool_call_end": lambda d: McpToolCallEndEvent(
+        call_id=d.get("call_id"),
+        result=d.get("result"),
+    ),
+    "exec_command_begin": lambda d: ExecCommandBeginEvent(
+        call_id=d.get("call_id"),
+        command=d.get("command", []),
+        cwd=d.get("cwd"),
+    ),
+    "exec_command_end": lambda d: ExecCommandEndEvent(*_EXEC_COMMAND_END_ITEMS(d)),
+    "exec_approval_request": lambda d: ExecApprovalRequestEvent(
+        command=d.get("command", []),
+        cwd=d.get("cwd"),
+        reason=d.get("reason"),
+    ),
+    "apply_patch_approval_request": lambda d: ApplyPatchApprovalRequestEvent(
+        changes=FileChanges(d.get("changes", {})),
+        reason=d.get("reason"),
+        grant_root=d.get("grant_root"),
+    ),
+    "background_event": lambda d: BackgroundEvent(message=d.get("message")),
+    "patch_apply_begin": lambda d: PatchApplyBeginEvent(
+        call_id=d.get("call_id"),
+        auto_approved=d.get("auto_approved", False),
+        changes=FileChanges(d.get("changes", {})),
+    ),
+    "patch_apply_end": lambda d: PatchApplyEndEvent(
+        call_id=d.get("call_id"),
+        stdout=d.get("stdout"),
+        stderr=d.get("stderr"),
+        success=d.get("success", False),
+    ),
+    "get_history_entry_response": lambda d: GetHistoryEntryResponseEvent(
+        offset=d.get("offset", 0),
+        log_id=d.get("log_id", 0),
+        entry=(
+            HistoryEntry(e["session_id"], e["ts"], e["text"])
+            if (e := d.get("entry")) is not None
+            else None
+        ),
+    ),
+}
@@ -1,61 +1,111 @@
-import json
-from dataclasses import dataclass, field
-from enum import Enum
-from typing import Any
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, ClassVar
 from uuid import uuid4
 
+from codex_protocol_event import StrEnum
 
-@dataclass
+
+def _to_json(obj: Any) -> Any:
+    # called by JSON encoder for objects it can not serialize by itself
+    if isinstance(obj, SubmissionOperation):
+        return _encode_operation(obj)
+    if isinstance(obj, InputItem):
+        return _INPUT_ITEM_ENCODERS[type(obj)](obj)
+    return obj.to_dict()
+
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        # dataclasses are passed to _to_json (to add their type), enums are native
+        return orjson.dumps(
+            obj, default=_to_json, option=orjson.OPT_PASSTHROUGH_DATACLASS
+        ).decode()
+
+except ImportError:  # orjson is optional (it may be unavailable for Vim's python)
+    from json import JSONEncoder
+
+    # single encoder for all submissions (json.dumps would create a new one for any
+    # non-default option), compact like orjson output
+    dumps = JSONEncoder(separators=(",", ":"), default=_to_json).encode
+
+
+@dataclass(slots=True)
 class SubmissionOperation:
-    def to_dict(self) -> dict[str, Any]:
-        raise NotImplementedError()
+    # operation is serialized as {"type": _tag, **fields} (by the JSON encoder), the
+    # tag is given in the class definition: class Op(SubmissionOperation, tag="op")
+    _tag: ClassVar[str]
+
+    def __init_subclass__(cls, tag: str | None = None, **kwargs: Any) -> None:
+        # explicit super() arguments, as dataclass(slots=True) replaces the class (and
+        # zero-argument super() would refer to the original one); the replacement of a
+        # subclass is created without the tag, which is kept in its copied namespace
+        super(SubmissionOperation, cls).__init_subclass__(**kwargs)
+        if tag is not None:
+            cls._tag = tag
 
 
-@dataclass
+# field names of each SubmissionOperation subclass (filled on its first encoding)
+_OPERATION_FIELDS: dict[type[SubmissionOperation], tuple[str, ...]] = {}
+
+
+def _encode_operation(op: SubmissionOperation) -> dict[str, Any]:
+    cls = type(op)
+    names = _OPERATION_FIELDS.get(cls)
+    if names is None:
+        names = _OPERATION_FIELDS[cls] = tuple(f.name for f in fields(cls))
+    return {"type": cls._tag, **{name: getattr(op, name) for name in names}}
+
+
+@dataclass(slots=True)
 class Submission:
     operation: SubmissionOperation
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: str = field(default_factory=lambda: uuid4().hex)
 
     def to_json(self) -> str:
-        return json.dumps({"id": self.id, "op": self.operation.to_dict()})
+        if type(self.operation) is Interrupt:
+            # fixed shape (and the id is a hex string, there is nothing to escape)
+            return f'{{"id":"{self.id}","op":{{"type":"interrupt"}}}}'
+        return dumps({"id": self.id, "op": self.operation})
 
 
 # Helper enums and dataclasses for Submission operations
 
 
-class ReasoningEffort(Enum):
+class ReasoningEffort(StrEnum):
     LOW = "low"
     MEDIUM = "medium"
     HIGH = "high"
     NONE = "none"
 
 
-class ReasoningSummary(Enum):
+class ReasoningSummary(StrEnum):
     AUTO = "auto"
     CONCISE = "concise"
     DETAILED = "detailed"
     NONE = "none"
 
 
-class AskForApproval(Enum):
+class AskForApproval(StrEnum):
     UNLESS_TRUSTED = "untrusted"
     ON_FAILURE = "on-failure"
     NEVER = "never"
 
 
-class ReviewDecision(Enum):
+class ReviewDecision(StrEnum):
     APPROVED = "approved"
     APPROVED_FOR_SESSION = "approved_for_session"
     DENIED = "denied"
     ABORT = "abort"
 
 
-class WireApi(Enum):
+class WireApi(StrEnum):
     RESPONSES = "responses"
     CHAT = "chat"
 
 
-@dataclass
+@dataclass(slots=True)
 class ModelProviderInfo:
     name: str
     base_url: str
@@ -67,66 +117,69 @@ class ModelProviderInfo:
     env_http_headers: dict[str, str] | None = None
 
     def to_dict(self) -> dict[str, Any]:
-        return {
+        # optional fields which are not set are left out (instead of sending nulls)
+        info = {
             "name": self.name,
             "base_url": self.base_url,
             "env_key": self.env_key,
             "env_key_instructions": self.env_key_instructions,
-            "wire_api": self.wire_api.value,
+            "wire_api": self.wire_api,
             "query_params": self.query_params,
             "http_headers": self.http_headers,
             "env_http_headers": self.env_http_headers,
         }
+        return {k: v for k, v in info.items() if v is not None}
 
 
-@dataclass
+@dataclass(slots=True)
 class InputItem:
-    def to_dict(self) -> dict[str, Any]:
-        raise NotImplementedError()
+    # input item is serialized by its function from _INPUT_ITEM_ENCODERS (called by the
+    # JSON encoder, while it walks UserInput.items)
+    pass
 
 
-@dataclass
+@dataclass(slots=True)
 class TextInput(InputItem):
     text: str
 
-    def to_dict(self) -> dict[str, Any]:
-        return {"type": "text", "text": self.text}
-
 
-@dataclass
+@dataclass(slots=True)
 class ImageInput(InputItem):
     image_url: str
 
-    def to_dict(self) -> dict[str, Any]:
-        return {"type": "image", "image_url": self.image_url}
-
 
-@dataclass
+@dataclass(slots=True)
 class LocalImageInput(InputItem):
     path: str
 
-    def to_dict(self) -> dict[str, Any]:
-        return {"type": "local_image", "path": self.path}
+
+_INPUT_ITEM_ENCODERS: dict[type[InputItem], Callable[[Any], dict[str, Any]]] = {
+    TextInput: lambda i: {"type": "text", "text": i.text},
+    ImageInput: lambda i: {"type": "image", "image_url": i.image_url},
+    LocalImageInput: lambda i: {"type": "local_image", "path": i.path},
+}
 
 
 class SandboxPolicy:
+    __slots__ = ()
+
     def to_dict(self) -> dict[str, Any]:
         raise NotImplementedError()
 
 
-@dataclass
+@dataclass(slots=True)
 class DangerFullAccess(SandboxPolicy):
     def to_dict(self) -> dict[str, Any]:
         return {"mode": "danger-full-access"}
 
 
-@dataclass
+@dataclass(slots=True)
 class ReadOnly(SandboxPolicy):
     def to_dict(self) -> dict[str, Any]:
         return {"mode": "read-only"}
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkspaceWrite(SandboxPolicy):
     writable_roots: list[str] = field(default_factory=list)
     network_access: bool = False
@@ -142,8 +195,8 @@ class WorkspaceWrite(SandboxPolicy):
 # SubmissionOperation subclasses
 
 
-@dataclass
-class ConfigureSession(SubmissionOperation):
+@dataclass(slots=True)
+class ConfigureSession(SubmissionOperation, tag="configure_session"):
     provider: ModelProviderInfo
     model: str
     model_reasoning_effort: ReasoningEffort
@@ -155,76 +208,35 @@ class ConfigureSession(SubmissionOperation):
     disable_response_storage: bool = False
     notify: list[str] | None = None
 
-    def to_dict(self) -> dict[str, Any]:
-        data: dict[str, Any] = {
-            "type": "configure_session",
-            "provider": self.provider.to_dict(),
-            "model": self.model,
-            "model_reasoning_effort": self.model_reasoning_effort.value,
-            "model_reasoning_summary": self.model_reasoning_summary.value,
-            "instructions": self.instructions,
-            "approval_policy": self.approval_policy.value,
-            "sandbox_policy": self.sandbox_policy.to_dict(),
-            "disable_response_storage": self.disable_response_storage,
-            "cwd": self.cwd,
-        }
-        if self.notify is not None:
-            data["notify"] = self.notify
-        return data
 
+@dataclass(slots=True)
+class Interrupt(SubmissionOperation, tag="interrupt"):
+    pass
 
-@dataclass
-class Interrupt(SubmissionOperation):
-    def to_dict(self) -> dict[str, Any]:
-        return {"type": "interrupt"}
 
-
-@dataclass
-class UserInput(SubmissionOperation):
+@dataclass(slots=True)
+class UserInput(SubmissionOperation, tag="user_input"):
     items: list[InputItem]
 
-    def to_dict(self) -> dict[str, Any]:
-        return {"type": "user_input", "items": [i.to_dict() for i in self.items]}
-
 
-@dataclass
-class ExecApproval(SubmissionOperation):
+@dataclass(slots=True)
+class ExecApproval(SubmissionOperation, tag="exec_approval"):
     id: str
     decision: ReviewDecision
 
-    def to_dict(self) -> dict[str, Any]:
-        return {"type": "exec_approval", "id": self.id, "decision": self.decision.value}
-
 
-@dataclass
-class PatchApproval(SubmissionOperation):
+@dataclass(slots=True)
+class PatchApproval(SubmissionOperation, tag="patch_approval"):
     id: str
     decision: ReviewDecision
 
-    def to_dict(self) -> dict[str, Any]:
-        return {
-            "type": "patch_approval",
-            "id": self.id,
-            "decision": self.decision.value,
-        }
 
-
-@dataclass
-class AddToHistory(SubmissionOperation):
+@dataclass(slots=True)
+class AddToHistory(SubmissionOperation, tag="add_to_history"):
     text: str
 
-    def to_dict(self) -> dict[str, Any]:
-        return {"type": "add_to_history", "text": self.text}
-
 
-@dataclass
-class GetHistoryEntryRequest(SubmissionOperation):
+@dataclass(slots=True)
+class GetHistoryEntryRequest(SubmissionOperation, tag="get_history_entry_request"):
     offset: int
     log_id: int
-
-    def to_dict(self) -> dict[str, Any]:
-        return {
-            "type": "get_history_entry_request",
-            "offset": self.offset,
-            "log_id": self.log_id,
-        }